@@ -3,7 +3,6 @@
 
 """
 Requirements:
-    - pip install sh
     - pip install pyqt5 (needs Qt5 backend on system)
     - v4l-utils: Use your package manger of choice (e.g. apt-get install v4l-utils)
     
@@ -12,9 +11,14 @@ Usage:
     
 """
 
-import sh
+import hashlib
+import json
+import os
+import re
 import sys
+from subprocess import run, PIPE, CalledProcessError
 from time import sleep
+from PyQt5.QtCore import QTimer, QSignalBlocker
 from PyQt5.QtWidgets import QApplication, QWidget, QHBoxLayout, QSlider
 from PyQt5.Qt import Qt, QLabel, QGridLayout, QPushButton
 
@@ -24,16 +28,18 @@ from PyQt5.Qt import Qt, QLabel, QGridLayout, QPushButton
 class CameraControl(object):
     """
     Interface class to the v4l2-ctl package.
-    All possible controls in the __init__ method were obtained by running 'v4l2-ctl --list-ctrls'.
+    All possible controls in CTRLS were obtained by running 'v4l2-ctl --list-ctrls'.
+    They serve as fallback, get_ctls() refreshes them from the actual device.
+    The refreshed table is cached in CACHE_DIR, so later starts only need to read the values.
     """
     
-  
-    def __init__(self):
-        self.cmd = sh.Command("/usr/bin/v4l2-ctl")
-        self.autofocus = False
-        
-        #key=name : type, min, max, step, default
-        self.ctrls={
+    CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "cam_control")
+    
+    RE_CTL = re.compile(r'^[ \t]*(?P<name>\w+)[ \t]+0x[0-9a-f]+[ \t]+\((?P<type>\w+)\)[ \t]*:[ \t]*(?P<rest>.*)$', re.MULTILINE | re.ASCII)
+    RE_ATTR = re.compile(r'\b(min|max|step|default|value|flags)=(-?\w+)', re.ASCII)
+    
+    #key=name : type, min, max, step, default
+    CTRLS = {
         'backlight_compensation':['int', 0,10,1,0],
         'brightness':['int',30,255,1,133],
         'contrast':['int',0,10,1,5],
@@ -49,32 +55,152 @@ class CameraControl(object):
         'white_balance_temperature':['int',2800,10000,1,4500],
         'white_balance_temperature_auto':['bool', 1,1,1,1],
         'zoom_absolute':['int', 0,10,1,0]
-        }
+    }
+    
+  
+    def __init__(self, device=None):
+        self.device = device
+        self._base = ["/usr/bin/v4l2-ctl"] + (["-d", device] if device else [])
+        self.autofocus = False
         
-    def getValue(self, name):
+        self.ctrls = dict(self.CTRLS)
+        cached = self.load_ctls()
+        self.values = self.getValues(*cached) if cached else {}
+        if cached and cached.keys() <= self.values.keys():
+            self.ctrls.update(cached)
+        else:
+            #no cache, or it names controls the camera no longer has (e.g. renamed by the driver)
+            if cached:
+                self.drop_ctls()
+            self.values = self.get_ctls()
+            if self.values:
+                self.save_ctls()
+        
+        #defaults written by resetControls, focus_absolute only without autofocus
+        self._reset = {name: self.ctrls[name][4] for name in
+                       ('backlight_compensation', 'brightness', 'sharpness', 'contrast')}
+        self._reset_focus = dict(self._reset, focus_absolute=self.ctrls['focus_absolute'][4])
+        
+    def cmd(self, *args):
+        """Run v4l2-ctl with the given arguments and return its output."""
+        return run(self._base + list(args), stdout=PIPE, stderr=PIPE, text=True, check=True).stdout
+        
+    def get_ctls(self):
+        """Update self.ctrls from 'v4l2-ctl -l', returns dict name: current value."""
         try:
-            ret = self.cmd("--get-ctrl", name)
-            val = [int(s) for s in ret.split() if s.isdigit()]
-            return val[0]
-        except:
-            print('Ups, could not read value.')
+            out = self.cmd("-l")
+        except (CalledProcessError, OSError):
+            print('Ups, could not list controls.')
+            return {}
+        vals = {}
+        ctrls = self.ctrls
+        find_attrs = self.RE_ATTR.findall
+        for m in self.RE_CTL.finditer(out):
+            name, typ = m.group('name'), m.group('type')
+            attrs = {k: int(v) if v.lstrip('-').isdigit() else v for k, v in find_attrs(m.group('rest'))}
+            old = ctrls.get(name, [typ, 0, 0, 0, 0])
+            ctrls[name] = [typ, attrs.get('min', old[1]), attrs.get('max', old[2]),
+                           attrs.get('step', old[3]), attrs.get('default', old[4])]
+            if 'value' in attrs:
+                vals[name] = attrs['value']
+        return vals
+        
+    def cache_file(self):
+        """Path of the control table cache for this device."""
+        device = self.device or "/dev/video0"
+        return os.path.join(self.CACHE_DIR, hashlib.sha1(device.encode()).hexdigest() + ".json")
+        
+    def device_id(self):
+        """Camera name and kernel release, None if unknown. Limits and control names change with the driver."""
+        node = os.path.basename(os.path.realpath(self.device or "/dev/video0"))
+        try:
+            with open(os.path.join("/sys/class/video4linux", node, "name")) as fd:
+                name = fd.read().strip()
+        except OSError:
+            return None
+        return f"{name}|{os.uname().release}"
+        
+    def load_ctls(self):
+        """Cached control table of this camera, empty dict if there is none for the current camera."""
+        ident = self.device_id()
+        if ident is None:
+            return {}
+        try:
+            with open(self.cache_file()) as fd:
+                cache = json.load(fd)
+        except (OSError, ValueError):
+            return {}
+        #the file is user editable, only trust it if it has the expected shape
+        if not isinstance(cache, dict) or cache.get("id") != ident:
+            return {}
+        ctrls = cache.get("ctrls")
+        if not isinstance(ctrls, dict) or not all(self.valid_ctl(c) for c in ctrls.values()):
+            return {}
+        return ctrls
+        
+    @staticmethod
+    def valid_ctl(c):
+        """True if c looks like a CTRLS entry: type name followed by int min, max, step, default."""
+        return (isinstance(c, list) and len(c) == 5 and isinstance(c[0], str)
+                and all(type(v) is int for v in c[1:]))
+        
+    def drop_ctls(self):
+        try:
+            os.remove(self.cache_file())
+        except OSError:
             pass
         
-    def setValue(self, name, val):
+    def save_ctls(self):
+        """Cache the controls the camera listed in get_ctls (those with a current value)."""
+        ident = self.device_id()
+        if ident is None:
+            return
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            with open(self.cache_file(), "w") as fd:
+                json.dump({"id": ident, "ctrls": {name: self.ctrls[name] for name in self.values}}, fd)
+        except OSError:
+            print('Ups, could not write control cache.')
+        
+    def getValues(self, *names):
+        """Read several controls with a single v4l2-ctl call, returns dict name: value."""
+        try:
+            ret = self.cmd("--get-ctrl", ",".join(names))
+            vals = {}
+            for line in ret.splitlines():
+                #output is 'name: value', value may be negative (e.g. pan_absolute)
+                name, sep, val = line.rpartition(":")
+                if sep:
+                    try:
+                        vals[name] = int(val)
+                    except ValueError:
+                        pass
+            return vals
+        except (CalledProcessError, OSError):
+            print('Ups, could not read values.')
+            return {}
+        
+    def getValue(self, name):
+        return self.getValues(name).get(name)
+        
+    def setValues(self, vals):
+        """Write several controls with a single v4l2-ctl call, vals is a dict name: value."""
         try:
-            self.cmd("--set-ctrl", (name+"="+str(val)))
-        except:
-            print('Ups, could not set value for ', name, '.')
+            self.cmd("--set-ctrl", ",".join(f"{name}={val}" for name, val in vals.items()))
+            self.values.update(vals)
+        except (CalledProcessError, OSError):
+            print(f"Ups, could not set values for {', '.join(vals)}.")
             pass
+        
+    def setValue(self, name, val):
+        self.setValues({name: val})
     
      
     def resetControls(self):
-        self.setValue('backlight_compensation', self.ctrls['backlight_compensation'][4])
-        self.setValue('brightness', self.ctrls['brightness'][4])
-        self.setValue('sharpness', self.ctrls['sharpness'][4])
-        self.setValue('contrast', self.ctrls['contrast'][4])
-        if not self.autofocus:
-            self.setValue('focus_absolute', self.ctrls['focus_absolute'][4])
+        """Write the defaults, returns the dict name: value that was written."""
+        vals = self._reset if self.autofocus else self._reset_focus
+        self.setValues(vals)
+        return vals
         
     def setAutofocus(self, on):
         if on:
@@ -89,31 +215,40 @@ class CameraControl(object):
         
   
 class Window(QWidget):  
+    _ON_STYLE = "background-color: green"
+    _OFF_STYLE = "background-color: red"
+    
     def __init__(self, cc):
         super().__init__()
         
         self.autofocus_bool = False
         self.camCtr = cc
+        self.timers = {}
         self.initUI()
         
         
     def initUI(self):
+        self.setUpdatesEnabled(False)
         self.setWindowTitle('Camera Control')
         self.setMinimumWidth(260)
         self.grid = QGridLayout()
         self.grid.setContentsMargins(4, 4, 4, 4)
         self.grid.setSpacing(2)
+        self.grid.setEnabled(False)
+        #values were already read along with the limits, only query again if that failed
+        vals = self.camCtr.values or self.camCtr.getValues('backlight_compensation', 'brightness',
+                                                           'sharpness', 'contrast', 'focus_absolute')
         
         ### add control elements ###
         self.backlight_lbl = QLabel("Backlight Compensation")
         self.grid.addWidget(self.backlight_lbl, 10,1,1,1, Qt.AlignLeft)
         self.backlight_comp_sl = QSlider()
         self.backlight_comp_sl.setOrientation(Qt.Horizontal)   
-        self.backlight_comp_sl.setValue(self.camCtr.getValue('backlight_compensation'))
+        self.backlight_comp_sl.setValue(vals.get('backlight_compensation', 0))
         self.backlight_comp_sl.setTickInterval(1)
         self.backlight_comp_sl.setMaximum(self.camCtr.ctrls['backlight_compensation'][2])
         self.backlight_comp_sl.setMinimum(self.camCtr.ctrls['backlight_compensation'][1])
-        self.backlight_comp_sl.valueChanged.connect(self.backlight_com_sl_Change)
+        self.debounce('backlight_compensation', self.backlight_comp_sl, self.backlight_com_sl_Change)
         self.backlight_comp_sl.setMinimumWidth(200)
         self.grid.addWidget(self.backlight_comp_sl, 10,2,1,1, Qt.AlignRight)
         
@@ -121,11 +256,11 @@ class Window(QWidget):
         self.grid.addWidget(self.brightness_lbl, 12,1,1,1, Qt.AlignLeft)
         self.brightness_sl = QSlider()
         self.brightness_sl.setOrientation(Qt.Horizontal)   
-        self.brightness_sl.setValue(self.camCtr.getValue('brightness'))
+        self.brightness_sl.setValue(vals.get('brightness', 0))
         self.brightness_sl.setTickInterval(1)
         self.brightness_sl.setMaximum(self.camCtr.ctrls['brightness'][2])
         self.brightness_sl.setMinimum(self.camCtr.ctrls['brightness'][1])
-        self.brightness_sl.valueChanged.connect(self.brighness_sl_Change)
+        self.debounce('brightness', self.brightness_sl, self.brighness_sl_Change)
         self.brightness_sl.setMinimumWidth(200)
         self.grid.addWidget(self.brightness_sl, 12,2,1,1, Qt.AlignRight)
 
@@ -133,11 +268,11 @@ class Window(QWidget):
         self.grid.addWidget(self.sharpness_lbl, 13,1,1,1, Qt.AlignLeft)
         self.sharpness_sl = QSlider()
         self.sharpness_sl.setOrientation(Qt.Horizontal)   
-        self.sharpness_sl.setValue(self.camCtr.getValue('sharpness'))
+        self.sharpness_sl.setValue(vals.get('sharpness', 0))
         self.sharpness_sl.setTickInterval(1)
         self.sharpness_sl.setMaximum(self.camCtr.ctrls['sharpness'][2])
         self.sharpness_sl.setMinimum(self.camCtr.ctrls['sharpness'][1])
-        self.sharpness_sl.valueChanged.connect(self.sharpness_sl_Change)
+        self.debounce('sharpness', self.sharpness_sl, self.sharpness_sl_Change)
         self.sharpness_sl.setMinimumWidth(200)
         self.grid.addWidget(self.sharpness_sl, 13,2,1,1, Qt.AlignRight)
         
@@ -145,11 +280,11 @@ class Window(QWidget):
         self.grid.addWidget(self.contrast_lbl, 14,1,1,1, Qt.AlignLeft)
         self.contrast_sl = QSlider()
         self.contrast_sl.setOrientation(Qt.Horizontal)   
-        self.contrast_sl.setValue(self.camCtr.getValue('contrast'))
+        self.contrast_sl.setValue(vals.get('contrast', 0))
         self.contrast_sl.setTickInterval(1)
         self.contrast_sl.setMaximum(self.camCtr.ctrls['contrast'][2])
         self.contrast_sl.setMinimum(self.camCtr.ctrls['contrast'][1])
-        self.contrast_sl.valueChanged.connect(self.contrast_sl_Change)
+        self.debounce('contrast', self.contrast_sl, self.contrast_sl_Change)
         self.contrast_sl.setMinimumWidth(200)
         self.grid.addWidget(self.contrast_sl, 14,2,1,1, Qt.AlignRight)
    
@@ -157,14 +292,17 @@ class Window(QWidget):
         self.grid.addWidget(self.focabs_lbl, 15,1,1,1, Qt.AlignLeft)
         self.focabs_sl = QSlider()
         self.focabs_sl.setOrientation(Qt.Horizontal)   
-        self.focabs_sl.setValue(self.camCtr.getValue('focus_absolute'))
+        self.focabs_sl.setValue(vals.get('focus_absolute', 0))
         self.focabs_sl.setTickInterval(1)
         self.focabs_sl.setMaximum(self.camCtr.ctrls['focus_absolute'][2])
         self.focabs_sl.setMinimum(self.camCtr.ctrls['focus_absolute'][1])
-        self.focabs_sl.valueChanged.connect(self.focabs_sl_Change)
+        self.debounce('focus_absolute', self.focabs_sl, self.focabs_sl_Change)
         self.focabs_sl.setMinimumWidth(200)
         self.grid.addWidget(self.focabs_sl, 15,2,1,1, Qt.AlignRight)
         self.grid.addWidget(QLabel(""),16,1,1,1, Qt.AlignCenter)
+        self.sliders = {'backlight_compensation': self.backlight_comp_sl, 'brightness': self.brightness_sl,
+                        'sharpness': self.sharpness_sl, 'contrast': self.contrast_sl,
+                        'focus_absolute': self.focabs_sl}
         
         self.reset = QPushButton()
         self.reset.setText('Reset')
@@ -173,7 +311,7 @@ class Window(QWidget):
         
         self.autofocus = QPushButton()
         self.autofocus.setText('Autofocus: OFF')
-        self.autofocus.setStyleSheet("background-color: red")
+        self.autofocus.setStyleSheet(self._OFF_STYLE)
         self.autofocus.clicked.connect(self.autofocus_Slot)
         self.grid.addWidget(self.autofocus, 17,2,1,1, Qt.AlignCenter)  
         ### end adding control elements      
@@ -181,8 +319,20 @@ class Window(QWidget):
         self.mainLayout = QHBoxLayout()
         self.mainLayout.addLayout(self.grid)
         self.setLayout(self.mainLayout)
+        self.grid.setEnabled(True)
+        self.grid.activate()
+        self.setUpdatesEnabled(True)
         self.show()
   
+    def debounce(self, name, slider, slot):
+        """Only call slot once the slider value has settled, instead of on every step while dragging."""
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(40)
+        timer.timeout.connect(slot)
+        slider.valueChanged.connect(lambda _: timer.start())
+        self.timers[name] = timer
+  
   
     def backlight_com_sl_Change(self):
         self.camCtr.setValue('backlight_compensation', self.backlight_comp_sl.value())
@@ -200,27 +350,28 @@ class Window(QWidget):
         self.camCtr.setValue('focus_absolute', self.focabs_sl.value())
 
        
+    def setSliderQuiet(self, slider, val):
+        """Move a slider without it writing the value back to the camera."""
+        with QSignalBlocker(slider):
+            slider.setValue(val)
+       
     def reset_Slot(self):
-        self.camCtr.resetControls()
-        self.backlight_comp_sl.setValue(self.camCtr.ctrls['backlight_compensation'][4])
-        self.brightness_sl.setValue(self.camCtr.ctrls['brightness'][4])
-        self.sharpness_sl.setValue(self.camCtr.ctrls['sharpness'][4])
-        self.contrast_sl.setValue(self.camCtr.ctrls['contrast'][4])
-        if not camCtr.autofocus:
-            self.focabs_sl.setValue(self.camCtr.ctrls['focus_absolute'][4])
+        for name, val in self.camCtr.resetControls().items():
+            self.setSliderQuiet(self.sliders[name], val)
     
     def autofocus_Slot(self):
-        if not self.camCtr.autofocus:
-            self.camCtr.setAutofocus(True)
-            self.focabs_sl.setDisabled(True)
-            self.autofocus.setText('Autofocus: ON')
-            self.autofocus.setStyleSheet("background-color: green")
+        cc, b, sl = self.camCtr, self.autofocus, self.focabs_sl
+        if not cc.autofocus:
+            cc.setAutofocus(True)
+            sl.setDisabled(True)
+            b.setText('Autofocus: ON')
+            b.setStyleSheet(self._ON_STYLE)
         else:
-            self.camCtr.setAutofocus(False)
-            self.focabs_sl.setDisabled(False)
-            self.autofocus.setText('Autofocus: OFF')
-            self.autofocus.setStyleSheet("background-color: red")
-            self.focabs_sl.setValue(self.camCtr.getValue('focus_absolute'))
+            cc.setAutofocus(False)
+            sl.setDisabled(False)
+            b.setText('Autofocus: OFF')
+            b.setStyleSheet(self._OFF_STYLE)
+            self.setSliderQuiet(sl, cc.getValue('focus_absolute'))
             
             
             
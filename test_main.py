@@ -0,0 +1,136 @@
+import json
+import tempfile
+import unittest
+from subprocess import CalledProcessError
+
+from main import CameraControl
+
+
+LISTING = """
+User Controls
+
+                     brightness 0x00980900 (int)    : min=30 max=255 step=1 default=133 value=140
+               do_white_balance 0x0098090d (button) :
+                     focus_auto 0x009a090c (bool)   : default=0 value=1
+                   pan_absolute 0x009a0908 (int)    : min=-201600 max=201600 step=3600 default=0 value=-3600
+                 focus_absolute 0x009a090a (int)    : min=0 max=40 step=1 default=0 value=5 flags=inactive
+"""
+
+
+class GetCtlsTest(unittest.TestCase):
+    def setUp(self):
+        #skip __init__, it would talk to the camera
+        self.cc = CameraControl.__new__(CameraControl)
+        self.cc.ctrls = dict(CameraControl.CTRLS)
+        self.cc.cmd = lambda *args: LISTING
+
+    def test_values(self):
+        self.assertEqual(self.cc.get_ctls(),
+                         {'brightness': 140, 'focus_auto': 1, 'pan_absolute': -3600, 'focus_absolute': 5})
+
+    def test_limits(self):
+        self.cc.get_ctls()
+        self.assertEqual(self.cc.ctrls['pan_absolute'], ['int', -201600, 201600, 3600, 0])
+        self.assertEqual(self.cc.ctrls['do_white_balance'], ['button', 0, 0, 0, 0])
+        #bool lines have no min/max/step, those are kept from CTRLS
+        self.assertEqual(self.cc.ctrls['focus_auto'], ['bool', 0, 0, 0, 0])
+
+    def test_fallback_untouched(self):
+        self.cc.get_ctls()
+        self.assertEqual(CameraControl.CTRLS['brightness'], ['int', 30, 255, 1, 133])
+
+
+
+class GetValuesTest(unittest.TestCase):
+    def test_skips_unparsable_lines(self):
+        cc = CameraControl.__new__(CameraControl)
+        cc.cmd = lambda *args: "brightness: 140\nfoo: 'abc'\npan_absolute: -3600\n"
+        self.assertEqual(cc.getValues('brightness', 'foo', 'pan_absolute'),
+                         {'brightness': 140, 'pan_absolute': -3600})
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cc = CameraControl.__new__(CameraControl)
+        self.cc.device = None
+        self.cc.CACHE_DIR = tmp.name
+        self.cc.device_id = lambda: "LifeCam|6.1.0"
+
+    def write(self, cache):
+        with open(self.cc.cache_file(), "w") as fd:
+            json.dump(cache, fd)
+
+    def test_valid(self):
+        self.write({"id": "LifeCam|6.1.0", "ctrls": {"brightness": ["int", 30, 255, 1, 133]}})
+        self.assertEqual(self.cc.load_ctls(), {"brightness": ["int", 30, 255, 1, 133]})
+
+    def test_other_camera(self):
+        self.write({"id": "LifeCam|6.2.0", "ctrls": {"brightness": ["int", 30, 255, 1, 133]}})
+        self.assertEqual(self.cc.load_ctls(), {})
+
+    def test_malformed(self):
+        for cache in (None, [], {"id": "LifeCam|6.1.0"}, {"id": "LifeCam|6.1.0", "ctrls": []},
+                      {"id": "LifeCam|6.1.0", "ctrls": {"brightness": ["int", 30]}},
+                      {"id": "LifeCam|6.1.0", "ctrls": {"brightness": ["int", "a", 10, 1, 0]}},
+                      {"id": "LifeCam|6.1.0", "ctrls": {"brightness": ["int", 30, 255, 1, True]}}):
+            self.write(cache)
+            self.assertEqual(self.cc.load_ctls(), {})
+
+    def test_round_trip(self):
+        self.cc.ctrls = dict(CameraControl.CTRLS)
+        self.cc.cmd = lambda *args: LISTING
+        self.cc.values = self.cc.get_ctls()
+        self.cc.save_ctls()
+        self.assertEqual(self.cc.load_ctls(), {name: self.cc.ctrls[name] for name in self.cc.values})
+
+
+class FakeCamera(CameraControl):
+    """CameraControl answering v4l2-ctl calls from LISTING, records the calls."""
+    controls = {'brightness': 140, 'focus_auto': 1, 'pan_absolute': -3600, 'focus_absolute': 5}
+
+    def device_id(self):
+        return "LifeCam|6.1.0"
+
+    def cmd(self, *args):
+        self.calls.append(args[0])
+        if args[0] == "-l":
+            return LISTING
+        names = args[1].split(",")
+        if not set(names) <= self.controls.keys():
+            raise CalledProcessError(255, args)
+        return "".join(f"{name}: {self.controls[name]}\n" for name in names)
+
+
+class InitTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        FakeCamera.CACHE_DIR = tmp.name
+        FakeCamera.calls = []
+
+    def test_cold_then_cached_start(self):
+        cc = FakeCamera()
+        self.assertEqual(FakeCamera.calls, ["-l"])
+        self.assertEqual(cc.values['pan_absolute'], -3600)
+        FakeCamera.calls = []
+        cc = FakeCamera()
+        self.assertEqual(FakeCamera.calls, ["--get-ctrl"])
+        self.assertEqual(cc.values, FakeCamera.controls)
+        self.assertEqual(cc.ctrls['pan_absolute'], ['int', -201600, 201600, 3600, 0])
+
+    def test_stale_cache(self):
+        cc = FakeCamera()
+        #control renamed by a newer driver
+        cc.ctrls['focus_automatic_continuous'] = cc.ctrls.pop('focus_auto')
+        cc.values['focus_automatic_continuous'] = cc.values.pop('focus_auto')
+        cc.save_ctls()
+        FakeCamera.calls = []
+        cc = FakeCamera()
+        self.assertEqual(FakeCamera.calls, ["--get-ctrl", "-l"])
+        self.assertEqual(cc.values, FakeCamera.controls)
+        self.assertEqual(set(cc.load_ctls()), set(FakeCamera.controls))
+
+if __name__ == '__main__':
+    unittest.main()